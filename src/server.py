@@ -4,14 +4,21 @@ Video Transcribe MCP Server - Transcribe YouTube/Instagram videos to text
 """
 
 import asyncio
+import logging
 import os
-import json
 import subprocess
 import tempfile
-import re
+import itertools
+from contextlib import closing, suppress
+import threading
+import numpy as np
+import orjson
 from pathlib import Path
+from urllib.parse import urlsplit
+from typing import Iterable, Iterator
 from datetime import datetime
 from dotenv import load_dotenv
+from yt_dlp import YoutubeDL
 from mcp.server import Server
 from mcp.server.stdio import stdio_server
 from mcp.types import Tool, TextContent
@@ -20,202 +27,244 @@ from mcp.types import Tool, TextContent
 PROJECT_DIR = Path(__file__).parent.parent
 load_dotenv(PROJECT_DIR / ".env")
 
+# Logs go to stderr, stdout carries the MCP protocol
+logger = logging.getLogger("video-transcribe-mcp")
+
+# Must be set before CTranslate2 is imported
+os.environ.setdefault("CT2_USE_EXPERIMENTAL_PACKED_GEMM", "1")
+
 # Configuration
-WHISPER_MODEL = os.getenv("WHISPER_MODEL", "large-v3")
+WHISPER_MODEL = os.getenv("WHISPER_MODEL", "large-v3-turbo")
 DEFAULT_LANGUAGE = os.getenv("DEFAULT_LANGUAGE", "ru")
+BATCH_SIZE = int(os.getenv("BATCH_SIZE", "8"))
+BEAM_SIZE = int(os.getenv("BEAM_SIZE", "1"))
 TRANSCRIPTS_DIR = Path(os.getenv("TRANSCRIPTS_DIR", "~/Documents/Transcripts")).expanduser()
-TEMP_DIR = PROJECT_DIR / "temp"
+SAMPLE_RATE = 16000  # Whisper expects 16 kHz mono PCM
+
+# Inference backend: "faster-whisper" (default) or "openvino" for Intel GPU/NPU
+BACKENDS = ("faster-whisper", "openvino")
+BACKEND = os.getenv("BACKEND", "faster-whisper").strip().lower()
+OPENVINO_MODEL_PATH = Path(os.getenv("OPENVINO_MODEL_PATH", "~/whisper-large-v3-turbo-ov")).expanduser()
+OPENVINO_DEVICE = os.getenv("OPENVINO_DEVICE", "NPU")
+OV_CACHE_DIR = PROJECT_DIR / ".ov_cache"
 
 # Ensure directories exist
 TRANSCRIPTS_DIR.mkdir(parents=True, exist_ok=True)
-TEMP_DIR.mkdir(parents=True, exist_ok=True)
-
-# Global whisper model (lazy loaded)
+if BACKEND == "openvino":
+    # Compiled kernels are cached here and reused across sessions
+    OV_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+
+# Shared yt-dlp instance (keeps extractors and HTTP session warm)
+_YDL_OPTIONS = {
+    "quiet": True,
+    "no_warnings": True,
+    "noplaylist": True,
+    "format": "bestaudio/best",
+    "socket_timeout": 60,  # A stalled extraction would block the URL pipeline
+}
+_YDL = YoutubeDL(_YDL_OPTIONS)
+_YDL_LOCK = threading.Lock()  # Handlers run in worker threads
+
+# Global whisper model (lazy loaded, kept for the whole process)
 whisper_model = None
+whisper_lock = threading.Lock()
+_model_load_lock = threading.Lock()  # Warmup and first tool call may race
 
 
 def get_whisper_model():
-    """Lazy load whisper model"""
+    """Lazy load whisper model (batched pipeline over an INT8 model, or OpenVINO pipeline)"""
     global whisper_model
-    if whisper_model is None:
-        from faster_whisper import WhisperModel
-        # Use GPU if available (for Apple Silicon), otherwise CPU
-        whisper_model = WhisperModel(
-            WHISPER_MODEL,
-            device="auto",
-            compute_type="auto"
-        )
+    if BACKEND not in BACKENDS:
+        raise ValueError(f"Unknown BACKEND '{BACKEND}', expected one of: {', '.join(BACKENDS)}")
+    with _model_load_lock:
+        if whisper_model is None and BACKEND == "openvino":
+            from openvino_genai import WhisperPipeline
+            whisper_model = WhisperPipeline(
+                str(OPENVINO_MODEL_PATH),
+                OPENVINO_DEVICE,
+                CACHE_DIR=str(OV_CACHE_DIR),
+            )
+        elif whisper_model is None:
+            import ctranslate2
+            from faster_whisper import WhisperModel, BatchedInferencePipeline
+            # INT8 weights with FP16 activations on CUDA, plain INT8 on CPU
+            if ctranslate2.get_cuda_device_count() > 0:
+                compute_type = "int8_float16"
+            else:
+                compute_type = "int8"
+            base = WhisperModel(
+                WHISPER_MODEL,
+                device="auto",
+                compute_type=compute_type,
+                num_workers=2,
+                cpu_threads=os.cpu_count() or 0,
+            )
+            # Decode VAD chunks of one file in parallel batches
+            whisper_model = BatchedInferencePipeline(model=base)
     return whisper_model
 
 
+def warmup_whisper_model():
+    """Load model and run a short silent clip to allocate kernels/workspace"""
+    model = get_whisper_model()
+    silence = np.zeros(SAMPLE_RATE, dtype=np.float32)
+    if BACKEND == "openvino":
+        with whisper_lock:
+            model.generate(silence)
+        return
+
+    with whisper_lock:
+        # Use the underlying model: VAD would drop the silence entirely
+        segments, _ = model.model.transcribe(
+            silence,
+            language=DEFAULT_LANGUAGE if DEFAULT_LANGUAGE != "auto" else None,
+            beam_size=1,
+        )
+        for _ in segments:
+            pass
+
+
+def _warmup_logged():
+    """Run warmup_whisper_model, logging instead of raising on failure"""
+    try:
+        warmup_whisper_model()
+    except Exception:
+        # Keep serving; tool calls will report the load error themselves
+        logger.exception("Whisper model warmup failed")
+
+
+def start_warmup():
+    """Warm up the model without delaying the MCP handshake or shutdown
+
+    Runs in a daemon thread rather than the default executor, so closing the
+    server during the first-run model download doesn't wait for it.
+    """
+    threading.Thread(target=_warmup_logged, name="whisper-warmup", daemon=True).start()
+
+
+# Characters not allowed in filenames
+_FN_BAD = str.maketrans("", "", '<>:"/\\|?*')
+
+
 def sanitize_filename(name: str) -> str:
     """Remove invalid characters from filename"""
-    # Remove invalid chars
-    name = re.sub(r'[<>:"/\\|?*]', '', name)
-    # Limit length
-    return name[:100].strip()
+    # Remove invalid chars, limit length
+    return name.translate(_FN_BAD)[:100].strip()
+
+
+# Host substrings checked in order, first match wins
+_PLATFORMS = (
+    ("youtube.com", "YouTube"),
+    ("youtu.be", "YouTube"),
+    ("instagram.com", "Instagram"),
+    ("vk.com", "VK"),
+    ("vkvideo", "VK"),
+    ("rutube.ru", "Rutube"),
+    ("tiktok.com", "TikTok"),
+)
 
 
 def detect_platform(url: str) -> str:
-    """Detect video platform from URL"""
-    url_lower = url.lower()
-    if "youtube.com" in url_lower or "youtu.be" in url_lower:
-        return "YouTube"
-    elif "instagram.com" in url_lower:
-        return "Instagram"
-    elif "vk.com" in url_lower or "vkvideo" in url_lower:
-        return "VK"
-    elif "rutube.ru" in url_lower:
-        return "Rutube"
-    elif "tiktok.com" in url_lower:
-        return "TikTok"
-    else:
-        return "Video"
+    """Detect video platform from URL host"""
+    parts = urlsplit(url)
+    if not parts.netloc:
+        # Accept URLs pasted without a scheme (e.g. "youtu.be/...")
+        parts = urlsplit(f"//{url}")
+    host = parts.netloc.lower()
+    for needle, platform in _PLATFORMS:
+        if needle in host:
+            return platform
+    return "Video"
+
+
+def get_video_meta(info: dict) -> dict:
+    """Pick display metadata out of a yt-dlp info dict"""
+    return {
+        "title": info.get("title") or "Unknown",
+        "duration": info.get("duration") or 0,
+        "uploader": info.get("uploader") or "Unknown",
+    }
 
 
-def get_video_info(url: str) -> dict:
-    """Get video metadata using yt-dlp"""
-    try:
-        result = subprocess.run(
-            ["yt-dlp", "--dump-json", "--no-download", url],
-            capture_output=True,
-            text=True,
-            timeout=60
-        )
-        if result.returncode == 0:
-            info = json.loads(result.stdout)
-            return {
-                "title": info.get("title", "Unknown"),
-                "duration": info.get("duration", 0),
-                "uploader": info.get("uploader", "Unknown"),
-            }
-    except Exception as e:
-        pass
-    return {"title": "Unknown", "duration": 0, "uploader": "Unknown"}
+def decode_audio(source: str, start_time: int = None, duration_limit: int = None, headers: dict = None) -> np.ndarray | None:
+    """Decode audio to 16 kHz mono float32 PCM by piping it out of ffmpeg
 
+    Args:
+        source: Local file path or direct stream URL
+        start_time: If set, start from this second (skip intro)
+        duration_limit: If set, decode only N seconds
+        headers: HTTP headers required by the stream URL
+    """
+    cmd = ["ffmpeg", "-nostdin", "-loglevel", "error"]
+
+    if headers:
+        cmd.extend(["-headers", "".join(f"{k}: {v}\r\n" for k, v in headers.items())])
+
+    # Add start time if specified
+    if start_time:
+        cmd.extend(["-ss", str(start_time)])
+
+    cmd.extend(["-i", source])
+
+    # Add duration limit if specified
+    if duration_limit:
+        cmd.extend(["-t", str(duration_limit)])
+
+    cmd.extend([
+        "-vn",  # No video
+        "-ac", "1",
+        "-ar", str(SAMPLE_RATE),
+        "-f", "s16le",
+        "pipe:1"
+    ])
 
-def get_audio_url(video_url: str) -> str | None:
-    """Get direct audio stream URL using yt-dlp"""
     try:
         result = subprocess.run(
-            ["yt-dlp", "-f", "bestaudio", "-g", video_url],
+            cmd,
             capture_output=True,
-            text=True,
-            timeout=60
+            timeout=900  # 15 min timeout for long videos
         )
-        if result.returncode == 0:
-            return result.stdout.strip()
-    except:
-        pass
-    return None
+    except subprocess.TimeoutExpired:
+        return None
+
+    if result.returncode != 0 or not result.stdout:
+        return None
 
+    return np.frombuffer(result.stdout, np.int16).astype(np.float32) / 32768.0
 
-def download_audio(url: str, output_path: Path, duration_limit: int = None, start_time: int = None) -> bool:
-    """Download audio from video URL
+
+def fetch_audio(url: str, duration_limit: int = None, start_time: int = None) -> tuple[dict, np.ndarray] | None:
+    """Fetch audio from video URL as PCM with a single yt-dlp extraction
 
     Args:
-        duration_limit: If set, download only N seconds
+        duration_limit: If set, fetch only N seconds
         start_time: If set, start from this second (skip intro)
+
+    Returns:
+        (video metadata, 16 kHz mono float32 samples), or None on failure
     """
     try:
-        # For preview/partial: try streaming with ffmpeg first (faster)
-        if duration_limit or start_time:
-            audio_url = get_audio_url(url)
-            if audio_url:
-                cmd = ["ffmpeg", "-y"]
-
-                # Add start time if specified
-                if start_time:
-                    cmd.extend(["-ss", str(start_time)])
-
-                cmd.extend(["-i", audio_url])
-
-                # Add duration limit if specified
-                if duration_limit:
-                    cmd.extend(["-t", str(duration_limit)])
-
-                cmd.extend([
-                    "-vn",  # No video
-                    "-acodec", "libmp3lame",
-                    "-ab", "192k",
-                    str(output_path)
-                ])
-
-                result = subprocess.run(
-                    cmd,
-                    capture_output=True,
-                    text=True,
-                    timeout=300  # 5 min timeout
-                )
-                if result.returncode == 0 and output_path.exists():
-                    return True
-                # If streaming failed, fall through to yt-dlp
-
-        # Download with yt-dlp (works for more video types)
-        temp_full = output_path.parent / f"full_{output_path.name}"
-        cmd = [
-            "yt-dlp",
-            "-x",  # Extract audio
-            "--audio-format", "mp3",
-            "--audio-quality", "0",  # Best quality
-            "-o", str(temp_full),
-            "--no-playlist",
-            "--no-warnings",
-            url
-        ]
+        with _YDL_LOCK:
+            info = _YDL.extract_info(url, download=False)
+        meta = get_video_meta(info)
 
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            timeout=900  # 15 min timeout for long videos
-        )
-
-        if result.returncode != 0:
-            return False
-
-        # Find downloaded file
-        actual_full = None
-        for f in output_path.parent.glob("full_*.mp3"):
-            actual_full = f
-            break
-
-        if not actual_full or not actual_full.exists():
-            return False
-
-        # Cut if duration limit specified
-        if duration_limit:
-            cut_result = subprocess.run(
-                [
-                    "ffmpeg", "-y",
-                    "-i", str(actual_full),
-                    "-t", str(duration_limit),
-                    "-acodec", "copy",
-                    str(output_path)
-                ],
-                capture_output=True,
-                text=True,
-                timeout=60
-            )
-            actual_full.unlink()
-            return cut_result.returncode == 0
-        else:
-            actual_full.rename(output_path)
-            return True
-
-    except Exception as e:
-        return False
+        # Stream the selected audio format straight through ffmpeg
+        audio_url = info.get("url")
+        if audio_url:
+            audio = decode_audio(audio_url, start_time, duration_limit, info.get("http_headers"))
+            if audio is not None:
+                return meta, audio
 
+        # If streaming failed, let yt-dlp download the already extracted info
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with YoutubeDL({**_YDL_OPTIONS, "outtmpl": str(Path(tmp_dir) / "audio.%(ext)s")}) as ydl:
+                info = ydl.process_ie_result(info, download=True)
+            audio = decode_audio(info["requested_downloads"][0]["filepath"], start_time, duration_limit)
 
-def format_timestamp(seconds: float) -> str:
-    """Format seconds to [MM:SS] or [HH:MM:SS]"""
-    hours = int(seconds // 3600)
-    minutes = int((seconds % 3600) // 60)
-    secs = int(seconds % 60)
+        return (meta, audio) if audio is not None else None
 
-    if hours > 0:
-        return f"[{hours:02d}:{minutes:02d}:{secs:02d}]"
-    return f"[{minutes:02d}:{secs:02d}]"
+    except Exception as e:
+        return None
 
 
 def format_duration(seconds) -> str:
@@ -230,27 +279,66 @@ def format_duration(seconds) -> str:
     return f"{minutes}:{secs:02d}"
 
 
-def transcribe_audio(audio_path: Path, language: str = "ru") -> list:
-    """Transcribe audio file using Whisper"""
+def transcribe_audio(audio: np.ndarray, language: str = "ru") -> Iterator[dict]:
+    """Transcribe 16 kHz mono float32 PCM samples using Whisper
+
+    Segments are yielded as the decoder produces them; the model lock is
+    held until the generator is exhausted or closed, so it must be consumed
+    and closed by one thread (see transcribe_and_consume).
+    """
     model = get_whisper_model()
 
-    segments, info = model.transcribe(
-        str(audio_path),
-        language=language if language != "auto" else None,
-        beam_size=5,
-        word_timestamps=False,
-        vad_filter=True,  # Filter out silence
-    )
-
-    result = []
-    for segment in segments:
-        result.append({
-            "start": segment.start,
-            "end": segment.end,
-            "text": segment.text.strip()
-        })
+    if BACKEND == "openvino":
+        kwargs = {"language": f"<|{language}|>"} if language != "auto" else {}
+        with whisper_lock:
+            # Pass the float32 array itself: tolist() would box every sample (~32 B each)
+            result = model.generate(audio, task="transcribe", return_timestamps=True, **kwargs)
+        for chunk in result.chunks or []:
+            yield {
+                "start": chunk.start_ts,
+                "end": chunk.end_ts,
+                "text": chunk.text.strip()
+            }
+        return
+
+    with whisper_lock:
+        segments, info = model.transcribe(
+            audio,
+            language=language if language != "auto" else None,
+            batch_size=BATCH_SIZE,
+            beam_size=BEAM_SIZE,  # 1 = greedy decoding
+            temperature=0.0,  # Batched pipeline has no temperature fallback
+            word_timestamps=False,
+            vad_filter=True,  # Filter out silence
+            # Keep the batched default split (160 ms) but pad speech less than
+            # the default 400 ms, so less silence reaches the decoder
+            vad_parameters=dict(
+                min_silence_duration_ms=160,
+                speech_pad_ms=100,
+            ),
+        )
 
-    return result
+        for segment in segments:
+            # Batched pipeline ignores no_speech/log_prob thresholds, apply them here
+            if segment.no_speech_prob > 0.45 and segment.avg_logprob < -1.0:
+                continue
+            yield {
+                "start": segment.start,
+                "end": segment.end,
+                "text": segment.text.strip()
+            }
+
+
+def collect_segments(segments: Iterable[dict]) -> tuple[int, float, str]:
+    """Fold segments into (count, end of last segment, full text) in one pass"""
+    count = 0
+    last_end = 0.0
+    texts = []
+    for seg in segments:
+        count += 1
+        last_end = seg["end"]
+        texts.append(seg["text"])
+    return count, last_end, " ".join(texts)
 
 
 def save_transcript(
@@ -258,48 +346,73 @@ def save_transcript(
     platform: str,
     title: str,
     duration: int,
-    segments: list,
+    segments: Iterable[dict],
     language: str
-) -> Path:
-    """Save transcript to file"""
+) -> tuple[Path, int, float, str]:
+    """Save transcript to file, consuming segments in a single pass
+
+    Returns:
+        (file path, segment count, end of last segment, full text)
+    """
     # Generate filename
-    date_str = datetime.now().strftime("%Y-%m-%d_%H%M")
+    now = datetime.now()
+    date_str = now.strftime("%Y-%m-%d_%H%M")
     safe_title = sanitize_filename(title)
     filename = f"{date_str}_{platform}_{safe_title}.txt"
     filepath = TRANSCRIPTS_DIR / filename
 
-    # Build content
-    lines = [
+    header = [
         f"Источник: {url}",
         f"Платформа: {platform}",
         f"Название: {title}",
-        f"Дата транскрипции: {datetime.now().strftime('%Y-%m-%d %H:%M')}",
+        f"Дата транскрипции: {now.strftime('%Y-%m-%d %H:%M')}",
         f"Длительность: {format_duration(duration)}",
         f"Язык: {language}",
         "",
         "=" * 50,
         "",
     ]
-
-    # Add segments with timestamps
-    for seg in segments:
-        timestamp = format_timestamp(seg["start"])
-        lines.append(f"{timestamp} {seg['text']}")
-
-    # Add plain text version at the end
-    lines.extend([
+    footer = [
         "",
         "=" * 50,
         "ПОЛНЫЙ ТЕКСТ (без таймкодов):",
         "=" * 50,
         "",
-        " ".join(seg["text"] for seg in segments)
-    ])
-
-    # Write file
-    filepath.write_text("\n".join(lines), encoding="utf-8")
+    ]
 
-    return filepath
+    # Write under a temporary name so a failed transcription leaves no partial file
+    part_path = filepath.with_name(filename + ".part")
+    try:
+        # Stream content through a 64 KB buffer instead of building one big string
+        with open(part_path, "w", encoding="utf-8", newline="\n", buffering=1 << 16) as f:
+            f.write("\n".join(header) + "\n")
+
+            # Add segments with timestamps
+            count = 0
+            last_end = 0.0
+            full_text_parts = []
+            for seg in segments:
+                # Inlined [MM:SS] / [HH:MM:SS] formatting, this loop runs per segment
+                h, rem = divmod(int(seg["start"]), 3600)
+                m, sec = divmod(rem, 60)
+                if h:
+                    f.write(f"[{h:02d}:{m:02d}:{sec:02d}] {seg['text']}\n")
+                else:
+                    f.write(f"[{m:02d}:{sec:02d}] {seg['text']}\n")
+                full_text_parts.append(seg["text"])
+                last_end = seg["end"]
+                count += 1
+
+            # Add plain text version at the end
+            full_text = " ".join(full_text_parts)
+            f.write("\n".join(footer) + "\n")
+            f.write(full_text)
+        os.replace(part_path, filepath)
+    except BaseException:
+        part_path.unlink(missing_ok=True)
+        raise
+
+    return filepath, count, last_end, full_text
 
 
 # Define MCP tools
@@ -366,16 +479,170 @@ TOOLS = [
 ]
 
 
-async def handle_transcribe_url(url: str, language: str = None, preview_minutes: int = None, start_minute: int = None) -> dict:
-    """Handle transcribe_url tool call"""
-    language = language or DEFAULT_LANGUAGE
-    platform = detect_platform(url)
+# URL pipeline: download of the next URL overlaps transcription of the current one
+_download_queue: asyncio.Queue = asyncio.Queue()
+_transcribe_queue: asyncio.Queue = asyncio.Queue(maxsize=1)  # Bounds prefetched PCM in memory
+_pipeline_tasks: list[asyncio.Task] = []
+_gpu_semaphore = asyncio.Semaphore(1)  # One inference at a time to avoid VRAM contention
+
+
+class TranscriptionCancelled(Exception):
+    """Raised in the inference thread once the caller has stopped waiting"""
+
+
+def _until_stopped(segments: Iterator[dict], stop: threading.Event) -> Iterator[dict]:
+    """Pass segments through, aborting at the next one after stop is set"""
+    for seg in segments:
+        if stop.is_set():
+            raise TranscriptionCancelled()
+        yield seg
 
-    # Get video info
-    info = get_video_info(url)
+
+def transcribe_and_consume(audio: np.ndarray, language: str, consume, stop: threading.Event):
+    """Transcribe and hand the segments to consume(), all in the calling thread
+
+    The segment generator is advanced and closed by the same thread, so the
+    model lock is released before this returns. Returns None if no speech
+    was detected, otherwise whatever consume() returns.
+    """
+    with closing(transcribe_audio(audio, language)) as segments:
+        checked = _until_stopped(segments, stop)
+        first = next(checked, None)
+        if first is None:
+            return None
+        return consume(itertools.chain([first], checked))
+
+
+async def run_transcription(audio: np.ndarray, language: str, consume, stop: threading.Event = None):
+    """Run transcribe_and_consume in a worker thread under the GPU semaphore
+
+    On cancellation the thread is told to stop and awaited before the
+    semaphore is released, so it always covers the whole inference.
+    """
+    stop = stop or threading.Event()
+    async with _gpu_semaphore:
+        task = asyncio.ensure_future(
+            asyncio.to_thread(transcribe_and_consume, audio, language, consume, stop)
+        )
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            stop.set()
+            with suppress(Exception):
+                await task
+            raise
+
+
+def _resolve(future: asyncio.Future, result: dict = None, error: Exception = None):
+    """Complete a job future unless the caller has gone away"""
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+
+async def downloader_worker():
+    """Fetch audio for queued URL jobs and hand it to the transcriber"""
+    while True:
+        job = await _download_queue.get()
+        fetched = None
+        try:
+            # Caller already gone (cancelled), don't download for nobody
+            if job["future"].done():
+                continue
+            # Fetch audio as PCM (with optional duration limit and start time)
+            fetched = await asyncio.to_thread(fetch_audio, job["url"], job["duration_limit"], job["start_time"])
+            if not fetched:
+                _resolve(job["future"], {"error": f"Failed to download audio from {job['url']}. Make sure the video is public."})
+            else:
+                await _transcribe_queue.put((job, fetched))
+        except Exception as e:
+            _resolve(job["future"], error=e)
+        finally:
+            _download_queue.task_done()
+            # Don't keep the last job's audio alive while waiting
+            job = fetched = None
+
+
+async def transcriber_worker():
+    """Transcribe fetched audio one job at a time"""
+    while True:
+        job, (info, audio) = await _transcribe_queue.get()
+        try:
+            if not job["future"].done():
+                result = await transcribe_url_job(job, info, audio)
+                _resolve(job["future"], result)
+        except Exception as e:
+            _resolve(job["future"], error=e)
+        finally:
+            _transcribe_queue.task_done()
+            # Drop the future (and any exception traceback) and audio before waiting
+            job = info = audio = None
+
+
+def start_url_pipeline():
+    """Start pipeline workers on the running event loop (once)"""
+    if not _pipeline_tasks:
+        _pipeline_tasks.append(asyncio.create_task(downloader_worker()))
+        _pipeline_tasks.append(asyncio.create_task(transcriber_worker()))
+
+
+async def transcribe_url_job(job: dict, info: dict, audio: np.ndarray) -> dict:
+    """Transcribe fetched URL audio and build the tool response"""
+    url = job["url"]
+    language = job["language"]
+    platform = detect_platform(url)
     title = info["title"]
     total_duration = info["duration"]
 
+    # Caller cancelling the tool call cancels the future; stop transcribing then
+    stop = threading.Event()
+    job["future"].add_done_callback(lambda _: stop.set())
+
+    if job["is_preview"]:
+        # For preview, don't save to file yet
+        consume = collect_segments
+    else:
+        # Save transcript only for full transcription
+        def consume(segments):
+            return save_transcript(url, platform, title, total_duration, segments, language)
+
+    # Transcribe (segments are streamed, None means no speech)
+    consumed = await run_transcription(audio, language, consume, stop)
+    if consumed is None:
+        return {"error": "No speech detected in the video"}
+
+    result = {
+        "success": True,
+        "platform": platform,
+        "title": title,
+        "language": language,
+    }
+
+    if job["is_preview"]:
+        count, last_end, full_text = consumed
+        transcribed_duration = int(last_end)
+        result["is_preview"] = True
+        result["preview_duration"] = format_duration(transcribed_duration)
+        result["total_duration"] = format_duration(total_duration)
+        remaining = int(total_duration) - transcribed_duration
+        result["remaining_duration"] = format_duration(remaining)
+        result["message"] = f"Превью первых {job['preview_minutes']} минут. Полная длина видео: {format_duration(total_duration)}. Скажи 'продолжай' или 'транскрибируй полностью' для полной версии."
+    else:
+        filepath, count, last_end, full_text = consumed
+        result["duration"] = format_duration(total_duration)
+        result["saved_to"] = str(filepath)
+
+    result["segments_count"] = count
+    result["transcript"] = full_text
+
+    return result
+
+
+async def handle_transcribe_url(url: str, language: str = None, preview_minutes: int = None, start_minute: int = None) -> dict:
+    """Handle transcribe_url tool call by queueing it on the URL pipeline"""
     # Calculate duration limit and start time
     duration_limit = None
     start_time = None
@@ -388,67 +655,18 @@ async def handle_transcribe_url(url: str, language: str = None, preview_minutes:
     if start_minute and start_minute > 0:
         start_time = start_minute * 60  # Convert to seconds
 
-    # Download audio to temp file
-    temp_audio = TEMP_DIR / f"audio_{datetime.now().strftime('%Y%m%d_%H%M%S')}.mp3"
-
-    try:
-        # Download (with optional duration limit and start time)
-        if not download_audio(url, temp_audio, duration_limit, start_time):
-            return {"error": f"Failed to download audio from {url}. Make sure the video is public."}
-
-        # Find the actual file (yt-dlp might add extension)
-        actual_file = None
-        for f in TEMP_DIR.glob("audio_*.mp3"):
-            actual_file = f
-            break
-
-        if not actual_file or not actual_file.exists():
-            return {"error": "Audio file not found after download"}
-
-        # Transcribe
-        segments = transcribe_audio(actual_file, language)
-
-        if not segments:
-            return {"error": "No speech detected in the video"}
-
-        # For preview, don't save to file yet
-        transcribed_duration = int(segments[-1]["end"]) if segments else 0
-
-        # Build response
-        full_text = " ".join(seg["text"] for seg in segments)
-
-        result = {
-            "success": True,
-            "platform": platform,
-            "title": title,
-            "language": language,
-            "segments_count": len(segments),
-            "transcript": full_text,
-        }
-
-        if is_preview:
-            result["is_preview"] = True
-            result["preview_duration"] = format_duration(transcribed_duration)
-            result["total_duration"] = format_duration(total_duration)
-            remaining = int(total_duration) - transcribed_duration
-            result["remaining_duration"] = format_duration(remaining)
-            result["message"] = f"Превью первых {preview_minutes} минут. Полная длина видео: {format_duration(total_duration)}. Скажи 'продолжай' или 'транскрибируй полностью' для полной версии."
-        else:
-            result["duration"] = format_duration(total_duration)
-            # Save transcript only for full transcription
-            filepath = save_transcript(url, platform, title, total_duration, segments, language)
-            result["saved_to"] = str(filepath)
-
-        return result
-
-    finally:
-        # Cleanup temp files
-        for pattern in ["audio_*", "full_*"]:
-            for f in TEMP_DIR.glob(pattern):
-                try:
-                    f.unlink()
-                except:
-                    pass
+    start_url_pipeline()
+    future = asyncio.get_running_loop().create_future()
+    await _download_queue.put({
+        "url": url,
+        "language": language or DEFAULT_LANGUAGE,
+        "preview_minutes": preview_minutes,
+        "is_preview": is_preview,
+        "duration_limit": duration_limit,
+        "start_time": start_time,
+        "future": future,
+    })
+    return await future
 
 
 async def handle_transcribe_file(file_path: str, language: str = None) -> dict:
@@ -459,52 +677,57 @@ async def handle_transcribe_file(file_path: str, language: str = None) -> dict:
     if not path.exists():
         return {"error": f"File not found: {file_path}"}
 
-    # Transcribe
-    segments = transcribe_audio(path, language)
-
-    if not segments:
-        return {"error": "No speech detected in the file"}
-
-    # Calculate duration from segments
-    duration = int(segments[-1]["end"]) if segments else 0
+    # Decode up front so the duration is known before the header is written
+    audio = await asyncio.to_thread(decode_audio, str(path))
+    if audio is None:
+        return {"error": f"Failed to read audio from {file_path}"}
+    duration = int(len(audio) / SAMPLE_RATE)
 
-    # Save transcript
-    filepath = save_transcript(
-        f"file://{path}",
-        "LocalFile",
-        path.stem,
-        duration,
-        segments,
-        language
-    )
+    def consume(segments):
+        return save_transcript(f"file://{path}", "LocalFile", path.stem, duration, segments, language)
 
-    # Build response
-    full_text = " ".join(seg["text"] for seg in segments)
+    # Transcribe and save (segments are streamed, None means no speech)
+    consumed = await run_transcription(audio, language, consume)
+    if consumed is None:
+        return {"error": "No speech detected in the file"}
+    filepath, count, _, full_text = consumed
 
     return {
         "success": True,
         "file": str(path),
         "duration": format_duration(duration),
         "language": language,
-        "segments_count": len(segments),
+        "segments_count": count,
         "saved_to": str(filepath),
         "transcript": full_text,
     }
 
 
-async def handle_list_transcripts(limit: int = 20) -> dict:
-    """Handle list_transcripts tool call"""
-    files = sorted(TRANSCRIPTS_DIR.glob("*.txt"), reverse=True)[:limit]
+def list_transcript_files(limit: int = 20) -> list[dict]:
+    """List saved transcripts, newest first"""
+    # Filenames start with the date, so sort by name and stat only the files returned
+    with os.scandir(TRANSCRIPTS_DIR) as it:
+        entries = [e for e in it if e.name.endswith(".txt") and e.is_file()]
+    entries.sort(key=lambda e: e.name, reverse=True)
 
     transcripts = []
-    for f in files:
+    for e in entries[:limit]:
+        st = e.stat()
         transcripts.append({
-            "filename": f.name,
-            "path": str(f),
-            "size_kb": round(f.stat().st_size / 1024, 1),
-            "modified": datetime.fromtimestamp(f.stat().st_mtime).strftime("%Y-%m-%d %H:%M"),
+            "filename": e.name,
+            "path": e.path,
+            "size_kb": round(st.st_size / 1024, 1),
+            "modified": datetime.fromtimestamp(st.st_mtime).strftime("%Y-%m-%d %H:%M"),
         })
 
+    return transcripts
+
+
+async def handle_list_transcripts(limit: int = 20) -> dict:
+    """Handle list_transcripts tool call"""
+    # Directory may live on a slow synced drive, keep the event loop free
+    transcripts = await asyncio.to_thread(list_transcript_files, limit)
+
     return {
         "transcripts_dir": str(TRANSCRIPTS_DIR),
         "count": len(transcripts),
@@ -534,10 +757,11 @@ async def handle_tool_call(name: str, arguments: dict) -> str:
         else:
             result = {"error": f"Unknown tool: {name}"}
 
-        return json.dumps(result, indent=2, ensure_ascii=False)
+        # Compact UTF-8 JSON: clients don't need pretty-printing
+        return orjson.dumps(result, option=orjson.OPT_NON_STR_KEYS).decode()
 
     except Exception as e:
-        return json.dumps({"error": str(e)}, indent=2)
+        return orjson.dumps({"error": str(e)}).decode()
 
 
 def main():
@@ -553,6 +777,13 @@ def main():
         result = await handle_tool_call(name, arguments)
         return [TextContent(type="text", text=result)]
 
+    if BACKEND not in BACKENDS:
+        # Don't fall back silently; tool calls will report the same error
+        logger.error("Unknown BACKEND '%s', expected one of: %s", BACKEND, ", ".join(BACKENDS))
+    else:
+        # Load and warm up the model once so the first tool call is not cold
+        start_warmup()
+
     async def run():
         async with stdio_server() as (read_stream, write_stream):
             await server.run(read_stream, write_stream, server.create_initialization_options())